@@ -0,0 +1,185 @@
+"""
+Compiled trade simulation
+Trade-by-trade backtest kernel over raw float64 arrays, shared by the
+backtest and walk-forward engines
+"""
+import numpy as np
+from _njit import njit, prange
+
+# Exit reason codes returned by simulate
+EXIT_REASONS = ('stop_loss', 'take_profit', 'trailing_stop', 'opposite_crossover', 'end_of_data')
+
+# Bars per vectorized chunk when searching forward for a stop/target/crossover exit
+EXIT_SEARCH_WINDOW = 256
+
+
+@njit(cache=True)
+def _first_exit(e, stop, tp, exit_cross, close, high, low, atr_14,
+                use_trailing, entry_px, size, point_value, trail_threshold,
+                trail_dist, window):
+    """
+    First bar after entry bar `e` where the stop, target, trailing stop or
+    crossover exit fires, in Strategy.should_exit's order of precedence
+    Compares whole chunks of `window` bars at a time; returns (bar, reason code)
+    """
+    n = len(low)
+    trail_active = False  # peak open profit has passed trail_threshold
+    start = e + 1
+    while start < n:
+        end = min(start + window, n)
+        hit_stop = low[start:end] <= stop
+        hit_tp = high[start:end] >= tp
+        hits = hit_stop | hit_tp | exit_cross[start:end]
+        if use_trailing:
+            # Once active the trailing stop stays active, so a running any() of
+            # the profit test stands in for the running peak profit
+            active = (close[start:end] - entry_px) * size * point_value > trail_threshold
+            if trail_active:
+                active[:] = True
+            else:
+                active = np.cumsum(active) > 0
+                trail_active = active[-1]
+            trail_level = close[start:end] - atr_14[start:end] * trail_dist
+            hit_trail = active & (trail_level > stop) & (low[start:end] <= trail_level)
+            hits |= hit_trail
+        if hits.any():
+            rel = np.argmax(hits)
+            if hit_stop[rel]:
+                return start + rel, 0
+            if hit_tp[rel]:
+                return start + rel, 1
+            if use_trailing and hit_trail[rel]:
+                return start + rel, 2
+            return start + rel, 3
+        start = end
+    return n - 1, 4
+
+
+@njit(cache=True)
+def _open_position(e, account, close, atr_14, atr_mult, rr_ratio, risk, point_value):
+    """Size, entry price, stop, target and dollar risk for a long entered at bar `e`'s close"""
+    stop_distance = atr_14[e] * atr_mult
+    size = max(1, int(account * risk / (stop_distance * point_value)))
+    pos_px = close[e]
+    pos_stop = pos_px - stop_distance
+    pos_tp = pos_px + stop_distance * rr_ratio
+    risk_amount = (pos_px - pos_stop) * size * point_value
+    return size, pos_px, pos_stop, pos_tp, risk_amount
+
+
+@njit(cache=True)
+def _exit_price(reason, i, pos_stop, pos_tp, close):
+    """Fill price for an exit: the stop/target level itself, otherwise bar `i`'s close"""
+    if reason == 0:
+        return pos_stop
+    if reason == 1:
+        return pos_tp
+    return close[i]
+
+
+@njit(cache=True)
+def simulate(entry_bars, exit_cross, close, high, low, atr_14,
+             init_cap, atr_mult, rr_ratio, risk, point_value,
+             use_trailing, trail_act, trail_dist, search_window):
+    """
+    Trade-by-trade simulation over raw arrays
+    Jumps straight to the next entry signal after each exit, and from each
+    entry straight to its exit bar found by _first_exit; exits follow
+    Strategy.should_exit
+    """
+    n = len(close)
+    entry_idx = np.empty(n, np.int64)
+    exit_idx = np.empty(n, np.int64)
+    entry_px = np.empty(n)
+    exit_px = np.empty(n)
+    sizes = np.empty(n, np.int64)
+    pnls = np.empty(n)
+    pnl_pcts = np.empty(n)
+    equity_after = np.empty(n)
+    reasons = np.empty(n, np.int8)
+    equity = np.empty(n)
+    in_pos = np.zeros(n, np.int8)
+
+    account = init_cap
+    n_trades = 0
+    next_free = 0  # first bar at which a new position may be opened
+
+    for e in entry_bars:
+        if e < next_free:
+            continue
+        equity[next_free:e + 1] = account
+
+        # Enter at the signal bar's close
+        size, pos_px, pos_stop, pos_tp, risk_amount = _open_position(
+            e, account, close, atr_14, atr_mult, rr_ratio, risk, point_value)
+
+        i, reason = _first_exit(e, pos_stop, pos_tp, exit_cross, close, high, low, atr_14,
+                                use_trailing, pos_px, size, point_value,
+                                risk_amount * trail_act, trail_dist, search_window)
+        equity[e + 1:i + 1] = account
+        in_pos[e + 1:i + 1] = 1
+
+        price = _exit_price(reason, i, pos_stop, pos_tp, close)
+        pnl = (price - pos_px) * size * point_value
+        entry_equity = account
+        account += pnl
+
+        entry_idx[n_trades] = e
+        exit_idx[n_trades] = i
+        entry_px[n_trades] = pos_px
+        exit_px[n_trades] = price
+        sizes[n_trades] = size
+        pnls[n_trades] = pnl
+        pnl_pcts[n_trades] = (pnl / entry_equity) * 100
+        equity_after[n_trades] = account
+        reasons[n_trades] = reason
+        n_trades += 1
+        # No new entry on the exit bar itself
+        next_free = i + 1
+
+    equity[next_free:] = account
+    return (n_trades, entry_idx, exit_idx, entry_px, exit_px, sizes, pnls,
+            pnl_pcts, equity_after, reasons, equity, in_pos)
+
+
+@njit(cache=True, parallel=True)
+def simulate_grid(entry_bars, exit_cross, close, high, low, atr_14, init_cap,
+                  atr_mult, rr_ratio, risk, use_trailing, trail_act, trail_dist,
+                  point_value, search_window):
+    """
+    Run simulate's trade logic for many parameter sets sharing one set of signals
+    The parameter arguments are equal-length arrays with one entry per
+    combination, which are simulated in parallel. Only summary statistics are
+    kept: returns per-combination (n_trades, n_wins, win_sum, loss_sum, final_capital)
+    """
+    n_combos = len(risk)
+    n_trades = np.zeros(n_combos, np.int64)
+    n_wins = np.zeros(n_combos, np.int64)
+    win_sum = np.zeros(n_combos)
+    loss_sum = np.zeros(n_combos)
+    final_capital = np.empty(n_combos)
+
+    for k in prange(n_combos):
+        account = init_cap
+        next_free = 0
+        for e in entry_bars:
+            if e < next_free:
+                continue
+            size, pos_px, pos_stop, pos_tp, risk_amount = _open_position(
+                e, account, close, atr_14, atr_mult[k], rr_ratio[k], risk[k], point_value)
+            i, reason = _first_exit(e, pos_stop, pos_tp, exit_cross, close, high, low, atr_14,
+                                    use_trailing[k], pos_px, size, point_value,
+                                    risk_amount * trail_act[k], trail_dist[k], search_window)
+            pnl = (_exit_price(reason, i, pos_stop, pos_tp, close) - pos_px) * size * point_value
+            account += pnl
+
+            n_trades[k] += 1
+            if pnl > 0:
+                n_wins[k] += 1
+                win_sum[k] += pnl
+            else:
+                loss_sum[k] += pnl
+            next_free = i + 1
+        final_capital[k] = account
+
+    return n_trades, n_wins, win_sum, loss_sum, final_capital
@@ -2,20 +2,35 @@
 Minimal Viable Backtest System
 A simple but functional backtesting framework
 """
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
+from _sim_numba import simulate, EXIT_REASONS, EXIT_SEARCH_WINDOW
 from data_pipeline import DataPipeline
 from strategy import Strategy, symbol_specs
 
+# Columns pulled out of the DataFrame once so the bar loop can index plain arrays
+ARRAY_COLUMNS = ('open', 'high', 'low', 'close', 'atr_14', 'atr_avg',
+                 'ema_9', 'ema_21', 'sma_20', 'sma_50', 'rsi', 'momentum_10')
+
+# Trade log columns, each stored in its own preallocated array
+TRADE_COLUMNS = ('entry_time', 'exit_time', 'entry_price', 'exit_price', 'position_size',
+                 'pnl', 'pnl_pct', 'exit_reason', 'equity_after')
+
+
 class BacktestEngine( ):
     
     def __init__(self, strategy, initial_capital=100000):
         self.strategy = strategy
         self.initial_capital = initial_capital
         self.account_value = initial_capital
+        self.point_value = symbol_specs[strategy.symbol]['point_value']
         
         # Trade tracking
-        self.trades = []
-        self.equity_curve = []
+        self.timestamps = np.empty(0, dtype=object)
+        self._allocate_trade_buffer(0)
+        self._equity = np.empty(0)
+        self._pos = np.empty(0, dtype=np.int8)
         self.current_position = None
     
     def run_backtest(self, data=None, params=None, start_date=None, end_date=None):
@@ -36,53 +51,135 @@ class BacktestEngine( ):
         '''
         pipeline.load_data_local()
         data=pipeline.data
+        arrs = self._column_arrays(data)
         print("Starting backtest...")
-        # Run through each bar
-        for idx in range(len(data)):
-            if idx%1000==0:
-                print(f'\r{idx}/{len(data)}', end="\r")
-            bar = data.iloc[idx]
-            
+        self._simulate(arrs)
+
+        # Write the result CSVs on a worker thread while the summary prints
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            saving = pool.submit(self._write_results)
+            self._print_results()
+            messages = saving.result()
+        print("\n".join(messages))
+
+    def _simulate(self, arrs, signals=None):
+        """
+        Run the compiled trade-by-trade simulation over `arrs`, starting from
+        the current account value, and fill the trade log and equity arrays
+        
+        `signals` is an optional precomputed (entry_mask, exit_mask) pair.
+        Strategies with their own compiled trade loop (`run_trades`) run it
+        instead; those with neither that nor `compute_signals` are stepped
+        bar by bar through their own should_enter / should_exit
+        """
+        strat = self.strategy
+        if signals is None and hasattr(strat, 'run_trades'):
+            self._store_run(strat.run_trades(arrs, float(self.account_value)), type(strat).EXIT_REASONS)
+            return
+        if signals is None and not hasattr(strat, 'compute_signals'):
+            self._simulate_bars(arrs)
+            return
+        if signals is None:
+            signals = strat.compute_signals(arrs)
+        entry_mask, exit_mask = signals
+        self._store_run(simulate(
+            np.flatnonzero(entry_mask), exit_mask,
+            arrs['close'], arrs['high'], arrs['low'], arrs['atr_14'],
+            float(self.account_value), float(strat.atr_stop_multiplier),
+            float(strat.reward_risk_ratio), float(strat.risk_per_trade),
+            float(self.point_value),
+            bool(strat.use_trailing_stop), float(strat.trailing_stop_activation),
+            float(strat.trailing_stop_distance), EXIT_SEARCH_WINDOW
+        ), EXIT_REASONS)
+
+    def _store_run(self, run, exit_reasons):
+        """
+        Fill the trade log and equity arrays from a compiled run's tuple
+        (see _sim_numba.simulate), naming its reason codes by `exit_reasons`
+        """
+        (n_trades, entry_idx, exit_idx, entry_px, exit_px, sizes, pnls,
+         pnl_pcts, equity_after, reasons, equity, in_pos) = run
+        self._n_trades = n_trades
+        self._entry_time = self.timestamps[entry_idx[:n_trades]]
+        self._exit_time = self.timestamps[exit_idx[:n_trades]]
+        self._entry_price = entry_px
+        self._exit_price = exit_px
+        self._position_size = sizes
+        self._pnl = pnls
+        self._pnl_pct = pnl_pcts
+        self._exit_reason = np.array(exit_reasons, dtype=object)[reasons[:n_trades]]
+        self._equity_after = equity_after
+        if n_trades:
+            self.account_value = equity_after[n_trades - 1]
+
+        self._equity = equity
+        self._pos = in_pos
+
+    def _simulate_bars(self, arrs):
+        """Run the strategy's should_enter / should_exit over every bar of `arrs`"""
+        n = len(arrs['close'])
+        # A trade spans at least two bars, so n slots always suffice
+        self._allocate_trade_buffer(n)
+        self._equity = np.empty(n)
+        self._pos = np.zeros(n, dtype=np.int8)
+        for idx in range(n):
             # Record equity at each bar
-            self.equity_curve.append({
-                'timestamp': bar.name,
-                'equity': self.account_value,
-                'position': 1 if self.current_position else 0
-            })
+            self._equity[idx] = self.account_value
             
             # Check if we should exit existing position
             if self.current_position:
-                should_exit, exit_reason = self.strategy.should_exit(data, idx, self.current_position)
+                self._pos[idx] = 1
+                should_exit, exit_reason = self.strategy.should_exit(arrs, idx, self.current_position)
                 if should_exit:
-                    self._exit_trade(data, idx, exit_reason)
+                    self._exit_trade(arrs, idx, exit_reason)
             
             # Check if we should enter new position
-            elif self.strategy.should_enter(data, idx):
-                self._enter_trade(data, idx)
+            elif self.strategy.should_enter(arrs, idx):
+                self._enter_trade(arrs, idx)
         
         # Close any open position at the end
         if self.current_position:
-            self._exit_trade(data, len(data)-1, 'end_of_data')
-         
-        self._print_results()
-        self._save_results()
+            self._exit_trade(arrs, n - 1, 'end_of_data')
+
+    def _column_arrays(self, data):
+        """Pull the columns the bar logic reads into float64 arrays, once per run"""
+        self.timestamps = data.index.to_numpy()
+        return {c: data[c].to_numpy(dtype=np.float64) for c in ARRAY_COLUMNS}
+
+    def _allocate_trade_buffer(self, size):
+        """Preallocate one array per trade log column, large enough for `size` trades"""
+        self._n_trades = 0
+        self._entry_time = np.empty(size, dtype=self.timestamps.dtype)
+        self._exit_time = np.empty(size, dtype=self.timestamps.dtype)
+        self._entry_price = np.empty(size)
+        self._exit_price = np.empty(size)
+        self._position_size = np.empty(size, dtype=np.int64)
+        self._pnl = np.empty(size)
+        self._pnl_pct = np.empty(size)
+        self._exit_reason = np.empty(size, dtype=object)
+        self._equity_after = np.empty(size)
 
+    def trades_frame(self):
+        """Return the recorded trades as a DataFrame"""
+        n = self._n_trades
+        return pd.DataFrame({col: getattr(self, '_' + col)[:n] for col in TRADE_COLUMNS})
 
-    def _enter_trade(self, data, idx):
+
+    def _enter_trade(self, arrs, idx):
         """Enter a new trade"""
-        bar = data.iloc[idx]
+        strat = self.strategy
         
         # Calculate position size
-        position_size = self.strategy.calculate_position_size(data=data, idx=idx, account_value=self.account_value)
+        position_size = strat.calculate_position_size(arrs=arrs, idx=idx, account_value=self.account_value)
         
         # Calculate entry price, stop loss, and take profit
-        entry_price = bar['close']
-        stop_distance = bar['atr_14'] * self.strategy.atr_stop_multiplier
+        entry_price = arrs['close'][idx]
+        stop_distance = arrs['atr_14'][idx] * strat.atr_stop_multiplier
         stop_loss = entry_price - stop_distance
-        take_profit = entry_price + (stop_distance * self.strategy.reward_risk_ratio)
+        take_profit = entry_price + (stop_distance * strat.reward_risk_ratio)
         
         self.current_position = {
-            'entry_time': bar.name,
+            'entry_time': self.timestamps[idx],
             'entry_price': entry_price,
             'position_size': position_size,
             'stop_loss': stop_loss,
@@ -90,12 +187,11 @@ class BacktestEngine( ):
             'entry_equity': self.account_value
         }
         
-        #print(f"\n{'LONG':<6} @ {bar.name} | Price: ${entry_price:,.2f} | Size: {position_size} | Stop: ${stop_loss:,.2f}")
+        #print(f"\n{'LONG':<6} @ {self.timestamps[idx]} | Price: ${entry_price:,.2f} | Size: {position_size} | Stop: ${stop_loss:,.2f}")
     
 
-    def _exit_trade(self, data, idx, reason):
+    def _exit_trade(self, arrs, idx, reason):
         """Exit current trade"""
-        bar = data.iloc[idx]
         pos = self.current_position
         
         # Determine exit price based on reason
@@ -104,37 +200,33 @@ class BacktestEngine( ):
         elif reason == 'take_profit':
             exit_price = pos['take_profit']
         else:  # end_of_data
-            exit_price = bar['close']
+            exit_price = arrs['close'][idx]
         
         # Calculate P&L
-        point_value = symbol_specs[self.strategy.symbol]['point_value']
         price_change = exit_price - pos['entry_price']
-        pnl = price_change * pos['position_size'] * point_value
+        pnl = price_change * pos['position_size'] * self.point_value
         pnl_pct = (pnl / pos['entry_equity']) * 100
         
         # Update account
         self.account_value += pnl
         
         # Record trade
-        trade = {
-            'entry_time': pos['entry_time'],
-            'exit_time': bar.name,
-            'entry_price': pos['entry_price'],
-            'exit_price': exit_price,
-            'position_size': pos['position_size'],
-            'pnl': pnl,
-            'pnl_pct': pnl_pct,
-            'exit_reason': reason,
-            'equity_after': self.account_value
-        }
-        self.trades.append(trade)
+        k = self._n_trades
+        self._entry_time[k] = pos['entry_time']
+        self._exit_time[k] = self.timestamps[idx]
+        self._entry_price[k] = pos['entry_price']
+        self._exit_price[k] = exit_price
+        self._position_size[k] = pos['position_size']
+        self._pnl[k] = pnl
+        self._pnl_pct[k] = pnl_pct
+        self._exit_reason[k] = reason
+        self._equity_after[k] = self.account_value
+        self._n_trades = k + 1
         
-        #print(f"EXIT   @ {bar.name} | Price: ${exit_price:,.2f} | P&L: ${pnl:,.2f} ({pnl_pct:+.2f}%) | Reason: {reason}")
+        #print(f"EXIT   @ {self.timestamps[idx]} | Price: ${exit_price:,.2f} | P&L: ${pnl:,.2f} ({pnl_pct:+.2f}%) | Reason: {reason}")
         
         self.current_position = None
 
-        return trade
-
     
 
     def _print_results(self):
@@ -143,23 +235,24 @@ class BacktestEngine( ):
         print("BACKTEST RESULTS")
         print("="*60)
         
-        if not self.trades:
+        if not self._n_trades:
             print("No trades executed")
             return
         
-        trades_df = pd.DataFrame(self.trades)
+        pnl = self._pnl[:self._n_trades]
+        wins = pnl > 0
         
         # Calculate metrics
-        total_trades = len(trades_df)
-        winning_trades = len(trades_df[trades_df['pnl'] > 0])
-        losing_trades = len(trades_df[trades_df['pnl'] <= 0])
-        win_rate = (winning_trades / total_trades) * 100 if total_trades > 0 else 0
+        total_trades = len(pnl)
+        winning_trades = int(wins.sum())
+        losing_trades = total_trades - winning_trades
+        win_rate = (winning_trades / total_trades) * 100
         
-        total_pnl = trades_df['pnl'].sum()
+        total_pnl = pnl.sum()
         total_return = ((self.account_value - self.initial_capital) / self.initial_capital) * 100
         
-        avg_win = trades_df[trades_df['pnl'] > 0]['pnl'].mean() if winning_trades > 0 else 0
-        avg_loss = trades_df[trades_df['pnl'] <= 0]['pnl'].mean() if losing_trades > 0 else 0
+        avg_win = pnl[wins].mean() if winning_trades > 0 else 0
+        avg_loss = pnl[~wins].mean() if losing_trades > 0 else 0
         
         print(f"\nInitial Capital:    ${self.initial_capital:,.2f}")
         print(f"Final Capital:      ${self.account_value:,.2f}")
@@ -175,25 +268,32 @@ class BacktestEngine( ):
             print(f"Profit Factor:      {abs(avg_win * winning_trades / (avg_loss * losing_trades)):.2f}")
 
         print()
-        print(trades_df['exit_reason'].value_counts().to_frame('counts'))
+        exit_reasons = pd.Series(self._exit_reason[:self._n_trades], name='exit_reason')
+        print(exit_reasons.value_counts().to_frame('counts'))
 
     def _save_results(self):
         """Save results to CSV files"""
+        print("\n".join(self._write_results()))
+
+    def _write_results(self):
+        """Write the trade log and equity curve CSVs, returning the status lines to print"""
+        messages = []
         # Save trades
-        if self.trades:
-            trades_df = pd.DataFrame(self.trades)
+        if self._n_trades:
+            trades_df = self.trades_frame()
             trades_df.to_csv('data/backtest_trades.csv', index=False)
-            print(f"\nTrades saved to 'data/backtest_trades.csv' ({len(trades_df)} trades)")
+            messages.append(f"\nTrades saved to 'data/backtest_trades.csv' ({len(trades_df)} trades)")
         else:
-            print(f"\nNo trades to save")
+            messages.append(f"\nNo trades to save")
 
         # Save equity curve
-        if self.equity_curve:
-            equity_df = pd.DataFrame(self.equity_curve)
+        if len(self._equity):
+            equity_df = pd.DataFrame({'timestamp': self.timestamps, 'equity': self._equity, 'position': self._pos})
             equity_df.to_csv('data/backtest_equity_curve.csv', index=False)
-            print(f"Equity curve saved to 'data/backtest_equity_curve.csv' ({len(equity_df)} bars)")
+            messages.append(f"Equity curve saved to 'data/backtest_equity_curve.csv' ({len(equity_df)} bars)")
         else:
-            print(f"No equity data to save")
+            messages.append(f"No equity data to save")
+        return messages
 
 
 
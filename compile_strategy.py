@@ -0,0 +1,23 @@
+"""
+Ahead-of-time build of the SMA strategy's signal scan
+Run once (python compile_strategy.py) to produce the sma_signals extension
+module next to this file; strategy_sma imports it when present, so new
+interpreters skip the JIT compile of the signal scan on first use
+"""
+import os
+from numba.pycc import CC
+import strategy_sma
+
+cc = CC('sma_signals')
+cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Same bodies as the JIT kernels, one per death cross exit setting, compiled
+# for the arrays precompute passes (float32 SMAs, float64 close)
+signature = 'void(f4[:], f4[:], f8[:], i8, b1[:], i1[:])'
+cc.export('scan', signature)(strategy_sma.build_scan(False).py_func)
+cc.export('scan_exit_cross', signature)(strategy_sma.build_scan(True).py_func)
+
+
+if __name__ == "__main__":
+    cc.compile()
+    print(f"✓ Built sma_signals in '{cc.output_dir}'")
@@ -1,7 +1,92 @@
 from datetime import datetime, timedelta
+import hashlib
+import os
+import time
 import yfinance as yf
+import bottleneck as bn
 import numpy as np
 import pandas as pd
+from _njit import njit
+
+# Copy-on-Write is the only mode from pandas 3.0; opt in on older versions so
+# derived frames share memory with their parent instead of copying defensively
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+# Bump whenever CSV parsing or _add_indicators changes so stale Parquet caches are not reused
+INDICATOR_VERSION = 3
+
+# Column layout of the tab-separated local CSV export
+CSV_COLUMNS = ["timestamp", "close", "high", "low", "open", "volume"]
+
+# Map our symbols to Yahoo Finance tickers
+TICKER_MAP = {
+    'NQ': 'NQ=F',  # E-mini Nasdaq-100 futures
+    'ES': 'ES=F',  # E-mini S&P 500 futures
+    'YM': 'YM=F',  # E-mini Dow futures
+    'RTY': 'RTY=F', # E-mini Russell 2000 futures
+    'EURUSD': 'EURUSD=X'
+}
+
+# Yahoo Finance accepts up to this many tickers in one download request
+YF_BATCH_SIZE = 20
+
+# Downloaded Yahoo Finance frames are kept here as Parquet, one file per request,
+# and downloaded again once the file is older than YF_CACHE_TTL seconds
+YF_CACHE_DIR = "data"
+YF_CACHE_TTL = 3600
+
+
+def _yf_download(tickers, interval, start_date, end_date, **kwargs):
+    """
+    yf.download, reusing the frame saved within the last YF_CACHE_TTL
+    seconds by an earlier identical request (same tickers, interval, days
+    and options) from a Parquet file
+    
+    Requests are keyed on the calendar days of their dates, so the default
+    range ending at datetime.now() maps to one file per day instead of a
+    new one on every call
+    """
+    start_day, end_day = pd.Timestamp(start_date).date(), pd.Timestamp(end_date).date()
+    request = f"{tickers}-{interval}-{start_day}-{end_day}-{sorted(kwargs.items())}"
+    cache_path = os.path.join(YF_CACHE_DIR, f"yf_{hashlib.md5(request.encode()).hexdigest()}.parquet")
+    if os.path.exists(cache_path) and time.time() - os.path.getmtime(cache_path) < YF_CACHE_TTL:
+        print(f"Loaded cached download from '{cache_path}'")
+        return pd.read_parquet(cache_path)
+    
+    raw = yf.download(
+        tickers,
+        start=start_date,
+        end=end_date,
+        interval=interval,
+        progress=False,
+        **kwargs
+    )
+    if raw is not None and not raw.empty:
+        os.makedirs(YF_CACHE_DIR, exist_ok=True)
+        raw.to_parquet(cache_path)
+    return raw
+
+
+@njit(cache=True)
+def _wilder_rma(x, n):
+    """Wilder's smoothing (EWMA with alpha = 1/n), seeded with the first value"""
+    y = np.empty_like(x)
+    y[0] = x[0]
+    for i in range(1, x.size):
+        y[i] = (y[i - 1] * (n - 1) + x[i]) / n
+    return y
+
+
+@njit(cache=True)
+def _ewma(x, alpha):
+    """EWMA matching Series.ewm(alpha=alpha, adjust=False).mean() on NaN-free input"""
+    y = np.empty_like(x)
+    y[0] = x[0]
+    for i in range(1, x.size):
+        y[i] = alpha * x[i] + (1 - alpha) * y[i - 1]
+    return y
+
 
 class DataPipeline:
     """Handles data loading and preparation"""
@@ -11,43 +96,17 @@ class DataPipeline:
     
     def load_data_yfinance(self, symbol, timeframe, start_date=None, end_date=None):
         """Download real data from Yahoo Finance"""
-        # Map our symbols to Yahoo Finance tickers
-        ticker_map = {
-            'NQ': 'NQ=F',  # E-mini Nasdaq-100 futures
-            'ES': 'ES=F',  # E-mini S&P 500 futures
-            'YM': 'YM=F',  # E-mini Dow futures
-            'RTY': 'RTY=F', # E-mini Russell 2000 futures
-            'EURUSD': 'EURUSD=X'
-        }
-        
-        ticker = ticker_map.get(symbol)
+        ticker = TICKER_MAP.get(symbol)
         interval = timeframe
-        
-        # Set default dates if not provided
-        if end_date is None:
-            end_date = datetime.now()
-        if start_date is None:
-            # Yahoo Finance limits intraday data to ~60 days
-            if interval == '1m':
-                start_date = end_date - timedelta(days=7)
-            elif interval in ['2m', '5m', '15m', '30m', '60m', '90m', '1h', '4h']:
-                start_date = end_date - timedelta(days=59)
-            else:
-                start_date = end_date - timedelta(days=365)
+        start_date, end_date = self._default_date_range(interval, start_date, end_date)
         
         print(f"Downloading {ticker} data from Yahoo Finance...")
         print(f"Period: {start_date.date()} to {end_date.date()}")
         
         try:
             # Download data from Yahoo Finance
-            self.data = yf.download(
-                ticker,
-                start=start_date,
-                end=end_date,
-                interval=interval,
-                progress=False,
-                multi_level_index=False
-            )
+            self.data = _yf_download(ticker, interval, start_date, end_date,
+                                     multi_level_index=False)
             
             if self.data.empty:
                 print("WARNING: No data returned from Yahoo Finance")
@@ -67,50 +126,128 @@ class DataPipeline:
         except Exception as e:
             print(f"Error downloading data: {e}")
         
+    @classmethod
+    def load_many(cls, symbols, timeframe, start_date=None, end_date=None):
+        """
+        Download several symbols with one Yahoo Finance request per batch
+        
+        Returns a dict of symbol -> DataPipeline with indicators added
+        """
+        start_date, end_date = cls._default_date_range(timeframe, start_date, end_date)
+        
+        pipelines = {}
+        for i in range(0, len(symbols), YF_BATCH_SIZE):
+            batch = symbols[i:i + YF_BATCH_SIZE]
+            tickers = [TICKER_MAP.get(symbol, symbol) for symbol in batch]
+            print(f"Downloading {', '.join(tickers)} from Yahoo Finance...")
+            
+            raw = _yf_download(' '.join(tickers), timeframe, start_date, end_date,
+                               group_by='ticker', multi_level_index=True)
+            
+            for symbol, ticker in zip(batch, tickers):
+                pipeline = cls()
+                if raw is None or ticker not in raw.columns.get_level_values(0):
+                    print(f"WARNING: No data returned for {ticker}")
+                    pipelines[symbol] = pipeline
+                    continue
+                
+                data = raw[ticker].dropna()
+                data.columns = [col.lower() for col in data.columns]
+                pipeline.data = data
+                if not data.empty:
+                    pipeline._add_indicators()
+                print(f"{symbol}: {len(data)} bars")
+                pipelines[symbol] = pipeline
+        
+        return pipelines
+    
+    @staticmethod
+    def _default_date_range(interval, start_date=None, end_date=None):
+        """Fill in missing dates, respecting Yahoo Finance's intraday history limits"""
+        if end_date is None:
+            end_date = datetime.now()
+        if start_date is None:
+            # Yahoo Finance limits intraday data to ~60 days
+            if interval == '1m':
+                start_date = end_date - timedelta(days=7)
+            elif interval in ['2m', '5m', '15m', '30m', '60m', '90m', '1h', '4h']:
+                start_date = end_date - timedelta(days=59)
+            else:
+                start_date = end_date - timedelta(days=365)
+        return start_date, end_date
+        
     def load_data_local(self):
-        self.data=pd.read_csv("data/EURUSD5.csv", sep="\t", index_col=0, header=None)
-        self.data.columns=["close", "high", "low", "open", "volume"]
-        print(self.data)
+        csv_path = "data/EURUSD5.csv"
+        cache_path = self._cache_path(csv_path)
 
+        if os.path.exists(cache_path):
+            # Reuse the indicator frame from a previous run on the same CSV
+            self.data = pd.read_parquet(cache_path)
+            print(f"Loaded cached indicators from '{cache_path}'")
+        else:
+            self.data = pd.read_csv(
+                csv_path,
+                sep="\t",
+                header=None,
+                names=CSV_COLUMNS,
+                dtype={col: "float64" for col in CSV_COLUMNS[1:]},
+                parse_dates=["timestamp"],
+                index_col=0,
+                engine="pyarrow"
+            )
+            print(self.data)
 
-        self._add_indicators()
+            self._add_indicators()
+            self.data.to_parquet(cache_path)
 
         print(f"Data loaded: {len(self.data)} bars from {self.data.index[0]} to {self.data.index[-1]}")
 
-
-    
+    @staticmethod
+    def _cache_path(csv_path):
+        """Parquet cache file for a CSV, keyed by its modification time and size"""
+        stat = os.stat(csv_path)
+        key = hashlib.md5(f"{stat.st_mtime}-{stat.st_size}-{INDICATOR_VERSION}".encode()).hexdigest()
+        return os.path.join(os.path.dirname(csv_path), f"cache_{key}.parquet")
 
     def _add_indicators(self):
             """Add technical indicators to the data"""
+            close = self.data['close'].to_numpy(dtype=np.float64)
+            high = self.data['high'].to_numpy(dtype=np.float64)
+            low = self.data['low'].to_numpy(dtype=np.float64)
+
             # ATR (Average True Range) - for volatility-based stops
-            self.data['high_low'] = self.data['high'] - self.data['low']
-            self.data['high_close'] = np.abs(self.data['high'] - self.data['close'].shift(1))
-            self.data['low_close'] = np.abs(self.data['low'] - self.data['close'].shift(1))
-            self.data['true_range'] = self.data[['high_low', 'high_close', 'low_close']].max(axis=1)
-            self.data['atr_14'] = self.data['true_range'].rolling(window=14).mean()
-
-            # ATR average for volatility filter
-            self.data['atr_avg'] = self.data['atr_14'].rolling(window=50).mean()
-
-            # Exponential Moving Averages (EMAs) for 9/21 crossover strategy
-            self.data['ema_9'] = self.data['close'].ewm(span=9, adjust=False).mean()
-            self.data['ema_21'] = self.data['close'].ewm(span=21, adjust=False).mean()
-
-            # Simple Moving Averages
-            self.data['sma_20'] = self.data['close'].rolling(window=20).mean()
-            self.data['sma_50'] = self.data['close'].rolling(window=50).mean()
-
-            # RSI (Relative Strength Index)
-            delta = self.data['close'].diff()
-            gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-            loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-            rs = gain / loss
-            self.data['rsi'] = 100 - (100 / (1 + rs))        
-
-            # Price momentum
-            self.data['momentum_10'] = self.data['close'] - self.data['close'].shift(10)
-
-            # Clean up temporary columns
-            self.data.drop(['high_low', 'high_close', 'low_close', 'true_range'], axis=1, inplace=True)
+            prev_close = np.roll(close, 1)
+            prev_close[0] = np.nan
+            # Element-wise max of the three ranges, reduced into one buffer;
+            # fmax skips the missing previous close on the first bar
+            true_range = high - low
+            np.fmax(true_range, np.abs(high - prev_close), out=true_range)
+            np.fmax(true_range, np.abs(low - prev_close), out=true_range)
+            atr_14 = bn.move_mean(true_range, window=14)
+
+            # RSI (Relative Strength Index) with Wilder's smoothing
+            delta = np.diff(close, prepend=close[0])
+            gain = np.where(delta > 0, delta, 0.0)
+            loss = np.where(delta < 0, -delta, 0.0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                rs = _wilder_rma(gain, 14) / _wilder_rma(loss, 14)
+
+            close_s = self.data['close']
+            # Build every indicator first and attach them in one assign call
+            indicators = {
+                'atr_14': atr_14,
+                # ATR average for volatility filter
+                'atr_avg': bn.move_mean(atr_14, window=50),
+                # Exponential Moving Averages (EMAs) for 9/21 crossover strategy
+                'ema_9': _ewma(close, 2 / (9 + 1)),
+                'ema_21': _ewma(close, 2 / (21 + 1)),
+                # Simple Moving Averages
+                'sma_20': bn.move_mean(close, window=20),
+                'sma_50': bn.move_mean(close, window=50),
+                'rsi': 100 - (100 / (1 + rs)),
+                # Price momentum
+                'momentum_10': close_s - close_s.shift(10),
+            }
+            self.data = self.data.assign(**indicators)
 
             print(f"\nIndicators added: EMA 9, EMA 21, ATR 14, ATR Avg, SMA 20, SMA 50, Momentum 10")        
\ No newline at end of file
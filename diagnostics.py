@@ -2,7 +2,7 @@
 Backtest Reality Check Diagnostics
 Identifies common issues that cause unrealistic returns
 """
-import pandas as pd
+import numpy as np
 from backtest import BacktestEngine
 from strategy import Strategy
 from data_pipeline import DataPipeline
@@ -28,12 +28,13 @@ def run_diagnostics():
     print(f"Average price: {data['close'].mean():.5f}")
     
     # Check for data issues
-    price_jumps = data['close'].pct_change().abs()
-    large_moves = price_jumps[price_jumps > 0.05]  # >5% moves
+    close = data['close'].to_numpy()
+    price_jumps = np.abs(np.diff(close) / close[:-1])
+    large_moves = np.flatnonzero(price_jumps > 0.05) + 1  # >5% moves
     if len(large_moves) > 0:
         print(f"\n⚠️  WARNING: Found {len(large_moves)} bars with >5% price moves")
         print("This could indicate data quality issues or gaps")
-        print("Sample dates:", large_moves.head().index.tolist())
+        print("Sample dates:", data.index[large_moves[:5]].tolist())
     
     # Check ATR values
     print(f"\nATR Statistics:")
@@ -49,11 +50,11 @@ def run_diagnostics():
     eng = BacktestEngine(strategy=strat, initial_capital=100000)
     eng.run_backtest()
     
-    if not eng.trades:
+    trades_df = eng.trades_frame()
+    if trades_df.empty:
         print("No trades executed - cannot diagnose")
         return
     
-    trades_df = pd.DataFrame(eng.trades)
     
     # Detailed trade analysis
     print(f"\n3. TRADE ANALYSIS")
@@ -63,28 +64,30 @@ def run_diagnostics():
     print(f"Trades per month: {len(trades_df) / 12:.1f}")
     
     # Check for suspiciously high wins
-    winners = trades_df[trades_df['pnl'] > 0]
-    losers = trades_df[trades_df['pnl'] <= 0]
+    pnl = trades_df['pnl'].to_numpy()
+    is_win = pnl > 0
+    winners = pnl[is_win]
+    losers = pnl[~is_win]
     
-    print(f"\nWinners: {len(winners)} ({len(winners)/len(trades_df)*100:.1f}%)")
-    print(f"Losers: {len(losers)} ({len(losers)/len(trades_df)*100:.1f}%)")
+    print(f"\nWinners: {len(winners)} ({len(winners)/len(pnl)*100:.1f}%)")
+    print(f"Losers: {len(losers)} ({len(losers)/len(pnl)*100:.1f}%)")
     
     if len(winners) > 0:
         print(f"\nWinning trades:")
-        print(f"  Average: ${winners['pnl'].mean():,.2f}")
-        print(f"  Median: ${winners['pnl'].median():,.2f}")
-        print(f"  Largest: ${winners['pnl'].max():,.2f}")
-        print(f"  Smallest: ${winners['pnl'].min():,.2f}")
+        print(f"  Average: ${winners.mean():,.2f}")
+        print(f"  Median: ${np.median(winners):,.2f}")
+        print(f"  Largest: ${winners.max():,.2f}")
+        print(f"  Smallest: ${winners.min():,.2f}")
     
     if len(losers) > 0:
         print(f"\nLosing trades:")
-        print(f"  Average: ${losers['pnl'].mean():,.2f}")
-        print(f"  Median: ${losers['pnl'].median():,.2f}")
-        print(f"  Largest loss: ${losers['pnl'].min():,.2f}")
+        print(f"  Average: ${losers.mean():,.2f}")
+        print(f"  Median: ${np.median(losers):,.2f}")
+        print(f"  Largest loss: ${losers.min():,.2f}")
     
     # Check win/loss ratio
     if len(winners) > 0 and len(losers) > 0:
-        avg_win_loss_ratio = abs(winners['pnl'].mean() / losers['pnl'].mean())
+        avg_win_loss_ratio = abs(winners.mean() / losers.mean())
         print(f"\nAverage Win/Loss Ratio: {avg_win_loss_ratio:.2f}x")
         if avg_win_loss_ratio > 5:
             print("⚠️  WARNING: Win/loss ratio > 5x is suspicious")
@@ -108,13 +111,11 @@ def run_diagnostics():
     sample_trades = trades_df.head(5)
     print("Checking first 5 trades for potential issues...")
     
-    for idx, trade in sample_trades.iterrows():
-        entry_time = trade['entry_time']
-        exit_time = trade['exit_time']
-        
-        # Find the bars
-        entry_bar = data[data.index == entry_time].iloc[0]
-        exit_bar = data[data.index == exit_time].iloc[0]
+    # Find the exit bars with a single index lookup
+    exit_rows = data.index.get_indexer(sample_trades['exit_time'])
+    
+    for (idx, trade), exit_row in zip(sample_trades.iterrows(), exit_rows):
+        exit_bar = data.iloc[exit_row]
         
         # Check if exit price is within the bar's range
         if trade['exit_reason'] == 'stop_loss':
@@ -193,21 +194,13 @@ def run_diagnostics():
     print(f"\n8. CONSISTENCY CHECK")
     print("-"*70)
     
-    # Find longest win/loss streaks
-    trades_df['is_win'] = trades_df['pnl'] > 0
-    streaks = []
-    current_streak = 1
-    
-    for i in range(1, len(trades_df)):
-        if trades_df.iloc[i]['is_win'] == trades_df.iloc[i-1]['is_win']:
-            current_streak += 1
-        else:
-            streaks.append(current_streak)
-            current_streak = 1
-    streaks.append(current_streak)
-    
-    print(f"Longest winning streak: {max([s for i, s in enumerate(streaks) if trades_df.iloc[i]['is_win']])} trades")
-    print(f"Longest losing streak: {max([s for i, s in enumerate(streaks) if not trades_df.iloc[i]['is_win']])} trades")
+    # Find longest win/loss streaks (run-length encoding of the win flags)
+    run_starts = np.concatenate(([0], np.flatnonzero(np.diff(is_win)) + 1))
+    run_lens = np.diff(np.append(run_starts, len(is_win)))
+    run_is_win = is_win[run_starts]
+    
+    print(f"Longest winning streak: {run_lens[run_is_win].max(initial=0)} trades")
+    print(f"Longest losing streak: {run_lens[~run_is_win].max(initial=0)} trades")
     
     # Exit reason distribution
     print(f"\n9. EXIT REASON ANALYSIS")
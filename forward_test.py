@@ -2,13 +2,120 @@
 Forward Testing Engine
 Implements walk-forward analysis to validate strategy robustness
 """
-import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from data_pipeline import DataPipeline
 from strategy import Strategy
 from backtest import BacktestEngine
+from _njit import NUMBA_AVAILABLE
+from _sim_numba import simulate_grid, EXIT_SEARCH_WINDOW
+import copy
+import csv
 import json
+import time
+
+try:
+    from joblib import Parallel, delayed
+    JOBLIB_AVAILABLE = True
+except ImportError:
+    JOBLIB_AVAILABLE = False
+
+
+def _with_params(strategy, params):
+    """Copy of `strategy` with the given parameters applied"""
+    strategy = copy.copy(strategy)
+    for param, value in params.items():
+        if hasattr(strategy, param):
+            setattr(strategy, param, value)
+    return strategy
+
+
+def run_single_backtest(strategy, arrs, timestamps, params, initial_capital, signals=None, with_trades=True):
+    """
+    Backtest one parameter combination on prepared column arrays
+    
+    Works on a copy of `strategy` and a fresh engine, so it has no side
+    effects and can run in a worker process. `signals` optionally passes in
+    precomputed (entry_mask, exit_mask) for these arrays and parameters;
+    with_trades=False skips building the per-trade records
+    """
+    engine = BacktestEngine(strategy=_with_params(strategy, params), initial_capital=initial_capital)
+    engine.timestamps = timestamps
+    engine._simulate(arrs, signals)
+    
+    # Calculate metrics straight from the trade log's pnl column
+    pnl = engine._pnl[:engine._n_trades]
+    if len(pnl):
+        is_win = pnl > 0
+        winners = pnl[is_win]
+        losers = pnl[~is_win]
+        
+        total_pnl = pnl.sum()
+        win_rate = (len(winners) / len(pnl)) * 100
+        
+        avg_win = winners.mean() if len(winners) > 0 else 0
+        avg_loss = losers.mean() if len(losers) > 0 else 0
+        profit_factor = _profit_factor(avg_win, len(winners), avg_loss, len(losers))
+    else:
+        total_pnl = 0
+        win_rate = 0
+        profit_factor = 0
+    
+    return {
+        'total_trades': len(pnl),
+        'win_rate': win_rate,
+        'total_pnl': total_pnl,
+        'profit_factor': profit_factor,
+        'final_capital': engine.account_value,
+        'trades': engine.trades_frame().to_dict('records') if with_trades else []
+    }
+
+
+def run_grid_backtest(strategy, arrs, param_combinations, initial_capital, signals):
+    """
+    Backtest combinations that share one set of signals in a single compiled call
+    
+    The combinations are simulated in parallel by simulate_grid; returns one
+    metrics dict per combination, in order, without trade records
+    """
+    # Execution parameters as one column per parameter, indexed by combination;
+    # anything the grid does not vary keeps the strategy's own value
+    table = np.asarray(
+        [[params.get(name, getattr(strategy, name)) for name in type(strategy).EXECUTION_PARAMS]
+         for params in param_combinations],
+        dtype=np.float64
+    )
+    (risk_arr, stop_mult_arr, rr_arr, trailing_arr,
+     trail_act_arr, trail_dist_arr) = np.ascontiguousarray(table.T)
+    
+    entry_mask, exit_mask = signals
+    n_trades, n_wins, win_sum, loss_sum, final_capital = simulate_grid(
+        np.flatnonzero(entry_mask), exit_mask,
+        arrs['close'], arrs['high'], arrs['low'], arrs['atr_14'], float(initial_capital),
+        stop_mult_arr, rr_arr, risk_arr, trailing_arr.astype(np.bool_),
+        trail_act_arr, trail_dist_arr,
+        float(strategy._point_value), EXIT_SEARCH_WINDOW
+    )
+    
+    all_results = []
+    for k in range(len(param_combinations)):
+        n_losses = n_trades[k] - n_wins[k]
+        avg_win = win_sum[k] / n_wins[k] if n_wins[k] > 0 else 0
+        avg_loss = loss_sum[k] / n_losses if n_losses > 0 else 0
+        all_results.append({
+            'total_trades': int(n_trades[k]),
+            'win_rate': (n_wins[k] / n_trades[k]) * 100 if n_trades[k] > 0 else 0,
+            'total_pnl': win_sum[k] + loss_sum[k],
+            'profit_factor': _profit_factor(avg_win, n_wins[k], avg_loss, n_losses),
+            'final_capital': final_capital[k],
+            'trades': []
+        })
+    return all_results
+
+
+def _profit_factor(avg_win, n_wins, avg_loss, n_losses):
+    """Gross profit over gross loss, 0 when there are no losing trades"""
+    return abs(avg_win * n_wins / (avg_loss * n_losses)) if avg_loss != 0 and n_losses > 0 else 0
 
 
 class ForwardTestEngine(BacktestEngine):
@@ -28,38 +135,43 @@ class ForwardTestEngine(BacktestEngine):
     def __init__(self, strategy, initial_capital=100000):
         self.strategy = strategy
         self.initial_capital = initial_capital
-        self.account_value = initial_capital
         
         # Walk-forward parameters
         self.in_sample_bars = 10000  # Bars to optimize on
         self.out_sample_bars = 5000  # Bars to test on
         self.step_size = 2500  # How many bars to roll forward
+        self.n_jobs = -1  # Worker processes for the grid search (-1 = all cores)
+        self.verbose = False  # Report grid-search timing per window
         
         # Results tracking
         self.all_windows = []
         self.combined_trades = []
         self.oos_trades = []  # Only out-of-sample trades
-        self.current_position = None
-        self.trades=[]
-
+        # Account and position state live inside each simulation run, never on
+        # the engine, so parameter combinations and windows cannot leak into each other
         
-    def run_walk_forward(self, param_grid=None):
+    def run_walk_forward(self, param_grid=None, data=None):
         """
         Run walk-forward analysis
         
         Args:
-            data: Full dataset
             param_grid: Dictionary of parameters to optimize
                        e.g., {'risk_per_trade': [0.01, 0.02, 0.03],
                               'atr_stop_multiplier': [1.5, 2.0, 2.5]}
+            data: Full dataset with indicators (loaded from the local CSV if None)
         """
         print("\n" + "="*70)
         print("WALK-FORWARD ANALYSIS")
         print("="*70)
         # Load data
-        pipeline = DataPipeline()
-        pipeline.load_data_local()
-        data = pipeline.data
+        if data is None:
+            pipeline = DataPipeline()
+            pipeline.load_data_local()
+            data = pipeline.data
+        
+        # Extract the columns once; every window works on views into these arrays
+        arrs = self._column_arrays(data)
+        timestamps = self.timestamps
     
         print(f"\nTotal data: {len(data)} bars")
         print(f"Period: {data.index[0]} to {data.index[-1]}")
@@ -72,6 +184,9 @@ class ForwardTestEngine(BacktestEngine):
                 'reward_risk_ratio': [3.0, 4.0, 5.0]
             }
         
+        # The grid is the same for every window, so expand it once
+        param_combinations = self._generate_param_combinations(param_grid)
+        
         # Calculate number of windows
         total_bars = len(data)
         window_start = 0
@@ -88,17 +203,17 @@ class ForwardTestEngine(BacktestEngine):
             oos_start = is_end
             oos_end = oos_start + self.out_sample_bars
             
-            is_data = data.iloc[is_start:is_end]
-            oos_data = data.iloc[oos_start:oos_end]
+            is_arrs, is_timestamps = self._window(arrs, timestamps, is_start, is_end)
+            oos_arrs, oos_timestamps = self._window(arrs, timestamps, oos_start, oos_end)
             
-            print(f"\nIn-Sample Period: {is_data.index[0]} to {is_data.index[-1]}")
-            print(f"  Bars: {len(is_data)}")
-            print(f"\nOut-of-Sample Period: {oos_data.index[0]} to {oos_data.index[-1]}")
-            print(f"  Bars: {len(oos_data)}")
+            print(f"\nIn-Sample Period: {data.index[is_start]} to {data.index[is_end - 1]}")
+            print(f"  Bars: {is_end - is_start}")
+            print(f"\nOut-of-Sample Period: {data.index[oos_start]} to {data.index[oos_end - 1]}")
+            print(f"  Bars: {oos_end - oos_start}")
             
             # Step 1: Optimize on in-sample data
             print(f"\nStep 1: Optimizing parameters on in-sample data...")
-            best_params, best_score = self._optimize_parameters(is_data, param_grid)
+            best_params, best_score = self._optimize_parameters(is_arrs, is_timestamps, param_combinations)
             
             print(f"\nBest Parameters Found:")
             for param, value in best_params.items():
@@ -107,7 +222,7 @@ class ForwardTestEngine(BacktestEngine):
             
             # Step 2: Test on out-of-sample data with best parameters
             print(f"\nStep 2: Testing on out-of-sample data...")
-            oos_results = self._run_single_backtest(oos_data, best_params)
+            oos_results = self._run_single_backtest(oos_arrs, oos_timestamps, best_params)
             
             print(f"\nOut-of-Sample Results:")
             print(f"  Trades: {oos_results['total_trades']}")
@@ -118,10 +233,10 @@ class ForwardTestEngine(BacktestEngine):
             # Store window results
             self.all_windows.append({
                 'window': window_num,
-                'is_start': is_data.index[0],
-                'is_end': is_data.index[-1],
-                'oos_start': oos_data.index[0],
-                'oos_end': oos_data.index[-1],
+                'is_start': data.index[is_start],
+                'is_end': data.index[is_end - 1],
+                'oos_start': data.index[oos_start],
+                'oos_end': data.index[oos_end - 1],
                 'best_params': best_params,
                 'is_score': best_score,
                 'oos_results': oos_results
@@ -143,33 +258,73 @@ class ForwardTestEngine(BacktestEngine):
         self._print_summary()
         self._save_results()
         
-    def _optimize_parameters(self, data, param_grid):
+    @staticmethod
+    def _window(arrs, timestamps, start, end):
+        """Zero-copy views of the column arrays and timestamps for bars [start, end)"""
+        return {c: a[start:end] for c, a in arrs.items()}, timestamps[start:end]
+    
+    def _optimize_parameters(self, arrs, timestamps, param_combinations):
         """
         Grid search optimization
-        Tests all parameter combinations and returns best
+        Tests all parameter combinations on the window's column arrays and returns best
         """
-        # Generate all parameter combinations
-        param_combinations = self._generate_param_combinations(param_grid)
-        
         print(f"  Testing {len(param_combinations)} parameter combinations...")
         
         best_score = -float('inf')
         best_params = None
+        started = time.perf_counter()
         
-        for i, params in enumerate(param_combinations):
-            # Run backtest with these parameters
-            results = self._run_single_backtest(data, params)
-            
+        # Only the entry filter parameters change the signals, so evaluate the
+        # rules once per distinct filter setting and share them across combinations.
+        # Strategies without compute_signals have nothing to share and are
+        # backtested bar by bar, one combination at a time
+        vectorised = hasattr(self.strategy, 'compute_signals')
+        signal_keys = []
+        signals = {}
+        for params in param_combinations:
+            if vectorised:
+                execution_params = type(self.strategy).EXECUTION_PARAMS
+                key = tuple((k, v) for k, v in params.items() if k not in execution_params)
+                if key not in signals:
+                    signals[key] = _with_params(self.strategy, dict(key)).compute_signals(arrs)
+            else:
+                key = None
+                signals[key] = None
+            signal_keys.append(key)
+        
+        # Combinations are independent, so backtest them in parallel: with Numba,
+        # one fused kernel call per signal group, otherwise one joblib task each
+        if NUMBA_AVAILABLE and vectorised:
+            all_results = [None] * len(param_combinations)
+            for key, key_signals in signals.items():
+                members = [i for i, k in enumerate(signal_keys) if k == key]
+                group_results = run_grid_backtest(
+                    self.strategy, arrs, [param_combinations[i] for i in members],
+                    self.initial_capital, key_signals
+                )
+                for i, results in zip(members, group_results):
+                    all_results[i] = results
+        else:
+            jobs = (
+                (self.strategy, arrs, timestamps, params, self.initial_capital, signals[key], False)
+                for params, key in zip(param_combinations, signal_keys)
+            )
+            if JOBLIB_AVAILABLE and self.n_jobs != 1:
+                all_results = Parallel(n_jobs=self.n_jobs)(delayed(run_single_backtest)(*job) for job in jobs)
+            else:
+                all_results = [run_single_backtest(*job) for job in jobs]
+        
+        if self.verbose:
+            print(f"    Tested {len(param_combinations)} combinations "
+                  f"({len(signals)} signal sets) in {time.perf_counter() - started:.2f}s")
+        
+        for params, results in zip(param_combinations, all_results):
             # Calculate score (you can customize this)
             score = self._calculate_fitness_score(results)
             
             if score > best_score:
                 best_score = score
                 best_params = params
-            
-            # Progress indicator
-            if (i + 1) % 10 == 0:
-                print(f"    Tested {i + 1}/{len(param_combinations)} combinations...")
         
         return best_params, best_score
     
@@ -183,57 +338,9 @@ class ForwardTestEngine(BacktestEngine):
         
         return combinations
     
-    def _run_single_backtest(self, data, params):
-        """Run a single backtest with given parameters"""
-        # Create strategy with custom parameters
-        
-        # Set parameters
-        for param, value in params.items():
-            if hasattr(self.strategy, param):
-                setattr(self.strategy, param, value)
-        
-        # Run backtest
-        trades = []
-        
-        for idx in range(len(data)):
-            if idx%1000==0:
-                print(f'{idx}/{len(data)}')
-            bar = data.iloc[idx]
-            
-            # Check exits
-            if self.current_position:
-                should_exit, exit_reason = self.strategy.should_exit(data, idx, self.current_position)
-                if should_exit:
-                    trades.append(self._exit_trade(data, idx, exit_reason))
-            # Check entries
-            elif self.strategy.should_enter(data, idx):
-                self._enter_trade(data, idx)
-        
-        # Calculate metrics
-        if trades:
-            trades_df = pd.DataFrame(trades)
-            winners = trades_df[trades_df['pnl'] > 0]
-            losers = trades_df[trades_df['pnl'] <= 0]
-            
-            total_pnl = trades_df['pnl'].sum()
-            win_rate = (len(winners) / len(trades_df)) * 100 if len(trades_df) > 0 else 0
-            
-            avg_win = winners['pnl'].mean() if len(winners) > 0 else 0
-            avg_loss = losers['pnl'].mean() if len(losers) > 0 else 0
-            profit_factor = abs(avg_win * len(winners) / (avg_loss * len(losers))) if avg_loss != 0 and len(losers) > 0 else 0
-        else:
-            total_pnl = 0
-            win_rate = 0
-            profit_factor = 0
-        
-        return {
-            'total_trades': len(trades),
-            'win_rate': win_rate,
-            'total_pnl': total_pnl,
-            'profit_factor': profit_factor,
-            'final_capital': self.account_value,
-            'trades': trades
-        }
+    def _run_single_backtest(self, arrs, timestamps, params):
+        """Run a single backtest with given parameters on a window's column arrays"""
+        return run_single_backtest(self.strategy, arrs, timestamps, params, self.initial_capital)
     
     def _calculate_fitness_score(self, results):
         """
@@ -291,17 +398,18 @@ class ForwardTestEngine(BacktestEngine):
         
         with open('walk_forward_summary.json', 'w') as f:
             # Convert datetime objects to strings for JSON
-            summary_serializable = json.loads(
-                json.dumps(summary, default=str)
-            )
-            json.dump(summary_serializable, f, indent=2)
+            json.dump(summary, f, default=str, indent=2)
         
         print(f"\n✓ Walk-forward summary saved to 'walk_forward_summary.json'")
         
         # Save OOS trades to CSV
         if self.oos_trades:
-            oos_df = pd.DataFrame(self.oos_trades)
-            oos_df.to_csv('walk_forward_oos_trades.csv', index=False)
+            # Stream the trade dicts straight to disk, no DataFrame copy
+            with open('walk_forward_oos_trades.csv', 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=list(self.oos_trades[0].keys()),
+                                        lineterminator='\n')
+                writer.writeheader()
+                writer.writerows(self.oos_trades)
             print(f"✓ Out-of-sample trades saved to 'walk_forward_oos_trades.csv'")
 
 
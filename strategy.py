@@ -1,5 +1,5 @@
-import pandas as pd
 import numpy as np
+import bottleneck as bn
 
 symbol_specs = {
     'NQ': {'tick_size': 0.25, 'point_value': 20, 'name': 'E-mini Nasdaq-100'},
@@ -7,6 +7,21 @@ symbol_specs = {
     'EURUSD': {'tick_size': 0.00001, 'point_value': 10, 'name': 'EURUSD'}
 }
 
+
+def _shift(x, periods=1, fill=np.nan):
+    """Shift an array forward by `periods` bars, padding the start with `fill`"""
+    out = np.empty_like(x)
+    out[:periods] = fill
+    out[periods:] = x[:-periods]
+    return out
+
+
+def _rolling_any(mask, window):
+    """True where `mask` was set on any of the last `window` bars, current bar included"""
+    # Moving max of the 0/1 flags; float32 is exact here and bottleneck's fastest input
+    return bn.move_max(mask.astype(np.float32), window=window, min_count=1) > 0
+
+
 class Strategy:
     """
     Enhanced 9/21 EMA Crossover Strategy with Multiple Filters
@@ -55,34 +70,94 @@ class Strategy:
     trailing_stop_activation = 1.2  # Activate after 1.2x risk in profit (was 1.5)
     trailing_stop_distance = 1.2  # Trail by 1.2x ATR (was 1.0)
     
+    # Parameters that only affect sizing and exits, not compute_signals
+    EXECUTION_PARAMS = ('risk_per_trade', 'atr_stop_multiplier', 'reward_risk_ratio',
+                        'use_trailing_stop', 'trailing_stop_activation', 'trailing_stop_distance')
+    
     def __init__(self):
         self.position = None
+        self._point_value = symbol_specs[self.symbol]['point_value']
         self.highest_profit = 0  # Track highest profit for trailing stop
     
-    def should_enter(self, data, idx):
+    def compute_signals(self, arrs):
+        """
+        Evaluate the entry and crossover-exit rules for every bar at once
+        
+        Returns (entry_mask, exit_mask): bars where should_enter would pass,
+        and bars where the 9 EMA crosses back below the 21 EMA
+        """
+        close, low = arrs['close'], arrs['low']
+        ema_9, ema_21, sma_50 = arrs['ema_9'], arrs['ema_21'], arrs['sma_50']
+        atr_14, atr_avg, momentum_10 = arrs['atr_14'], arrs['atr_avg'], arrs['momentum_10']
+        prev_ema_9, prev_ema_21 = _shift(ema_9), _shift(ema_21)
+        
+        # Every filter is ANDed into this one mask in place, a comparison at a
+        # time, so chained & expressions don't allocate extra temporaries
+        # Need enough data for all indicators, and all of them defined
+        entry = np.ones(len(close), dtype=bool)
+        entry[:60] = False
+        for ind in (ema_9, ema_21, atr_14, sma_50, atr_avg):
+            entry &= np.isfinite(ind)
+        
+        # Side of the 21 EMA the 9 EMA is on: +1 above, -1 below, 0 level
+        side = np.sign(ema_9 - ema_21)
+        prev_side = _shift(side)
+        
+        # === CROSSOVER DETECTION === (within the last 6 bars, including current)
+        above = side > 0
+        cross_up = (prev_side <= 0) & above
+        entry &= above
+        entry &= _rolling_any(cross_up, 6)
+        
+        if self.use_trend_filter:
+            entry &= close > sma_50
+            entry &= ema_21 > sma_50
+        
+        if self.use_volatility_filter:
+            entry &= atr_14 >= (atr_avg * self.min_atr_multiplier)
+        
+        if self.use_momentum_filter:
+            entry &= momentum_10 > 0
+            entry &= momentum_10 > _shift(momentum_10)
+        
+        if self.use_ema_slope_filter:
+            entry &= ema_9 > prev_ema_9
+            entry &= ema_21 > prev_ema_21
+        
+        if self.use_pullback_filter:
+            # Pullback on any of the previous N bars (current bar excluded)
+            pullback = (low < ema_9) | (close < _shift(close))
+            entry &= _shift(_rolling_any(pullback, self.pullback_lookback), fill=False)
+        
+        # === ADDITIONAL CONFIRMATION / EMA SEPARATION ===
+        with np.errstate(divide='ignore', invalid='ignore'):
+            entry &= close > ema_9
+            entry &= close > ema_21
+            entry &= (close - ema_9) / atr_14 < 2.0
+            entry &= (ema_9 - ema_21) / atr_14 > 0.1
+        
+        exit_mask = (prev_side >= 0) & (side < 0)
+        return entry, exit_mask
+    
+    def should_enter(self, arrs, idx):
         """Determine if we should enter a trade"""
         if idx < 60:  # Need enough data for all indicators
             return False
         
-        current = data.iloc[idx]
-        previous = data.iloc[idx - 1]
-        
         # Check if we have valid indicators
         required_indicators = ['ema_9', 'ema_21', 'atr_14', 'sma_50', 'atr_avg']
-        if any(pd.isna(current[ind]) for ind in required_indicators):
+        if any(np.isnan(arrs[ind][idx]) for ind in required_indicators):
             return False
         
         # === CROSSOVER DETECTION ===
         recent_crossover=False
         # Check if we're in bullish territory 
-        if current['ema_9'] > current['ema_21']:
+        if arrs['ema_9'][idx] > arrs['ema_21'][idx]:
             # Look back to see if there was a crossover recently
             for lookback in range(0, 6):  # Check last 6 bars (including current)
                 if idx - lookback < 0:
                     break
-                prev = data.iloc[idx - lookback]
-                prev_prev = data.iloc[idx - lookback - 1]
-                if prev_prev['ema_9'] <= prev_prev['ema_21'] and prev['ema_9'] > prev['ema_21']:
+                if arrs['ema_9'][idx - lookback - 1] <= arrs['ema_21'][idx - lookback - 1] and arrs['ema_9'][idx - lookback] > arrs['ema_21'][idx - lookback]:
                     recent_crossover = True
                     break
         
@@ -91,33 +166,33 @@ class Strategy:
         
         # === FILTER 1: LONG-TERM TREND ===
         if self.use_trend_filter:
-            long_term_uptrend = current['close'] > current['sma_50']
+            long_term_uptrend = arrs['close'][idx] > arrs['sma_50'][idx]
             # Also check that 21 EMA is above 50 SMA (strong trend)
-            ema21_above_sma50 = current['ema_21'] > current['sma_50']
+            ema21_above_sma50 = arrs['ema_21'][idx] > arrs['sma_50'][idx]
             if not (long_term_uptrend and ema21_above_sma50):
                 return False
         
         # === FILTER 2: VOLATILITY ===
         if self.use_volatility_filter:
             # Only trade when volatility is sufficient (not choppy/ranging)
-            sufficient_volatility = current['atr_14'] >= (current['atr_avg'] * self.min_atr_multiplier)
+            sufficient_volatility = arrs['atr_14'][idx] >= (arrs['atr_avg'][idx] * self.min_atr_multiplier)
             if not sufficient_volatility:
                 return False
         
         # === FILTER 3: MOMENTUM ===
         if self.use_momentum_filter:
             # Require strong positive momentum
-            strong_momentum = current['momentum_10'] > 0
+            strong_momentum = arrs['momentum_10'][idx] > 0
             # Also check momentum is accelerating
-            momentum_increasing = current['momentum_10'] > previous['momentum_10']
+            momentum_increasing = arrs['momentum_10'][idx] > arrs['momentum_10'][idx - 1]
             if not (strong_momentum and momentum_increasing):
                 return False
         
         # === FILTER 4: EMA SLOPE ===
         if self.use_ema_slope_filter:
             # Both EMAs should be trending up (not flat)
-            ema9_slope_positive = current['ema_9'] > previous['ema_9']
-            ema21_slope_positive = current['ema_21'] > previous['ema_21']
+            ema9_slope_positive = arrs['ema_9'][idx] > arrs['ema_9'][idx - 1]
+            ema21_slope_positive = arrs['ema_21'][idx] > arrs['ema_21'][idx - 1]
             if not (ema9_slope_positive and ema21_slope_positive):
                 return False
         
@@ -129,9 +204,8 @@ class Strategy:
             for lookback in range(1, self.pullback_lookback + 1):
                 if idx - lookback < 0:
                     break
-                past_bar = data.iloc[idx - lookback]
                 # Pullback = price went below 9 EMA or closed lower
-                if past_bar['low'] < past_bar['ema_9'] or past_bar['close'] < data.iloc[idx - lookback - 1]['close']:
+                if arrs['low'][idx - lookback] < arrs['ema_9'][idx - lookback] or arrs['close'][idx - lookback] < arrs['close'][idx - lookback - 1]:
                     had_pullback = True
                     break
             
@@ -141,10 +215,10 @@ class Strategy:
         
         # === ADDITIONAL CONFIRMATION ===
         # Price should be above both EMAs (but not too far - avoid chasing)
-        price_above_emas = current['close'] > current['ema_9'] and current['close'] > current['ema_21']
+        price_above_emas = arrs['close'][idx] > arrs['ema_9'][idx] and arrs['close'][idx] > arrs['ema_21'][idx]
         
         # Don't enter if price is too far from EMAs (overextended)
-        distance_from_ema9 = (current['close'] - current['ema_9']) / current['atr_14']
+        distance_from_ema9 = (arrs['close'][idx] - arrs['ema_9'][idx]) / arrs['atr_14'][idx]
         not_overextended = distance_from_ema9 < 2.0  # Within 2 ATRs of 9 EMA
         
         if not (price_above_emas and not_overextended):
@@ -152,7 +226,7 @@ class Strategy:
         
         # === EMA SEPARATION CHECK ===
         # EMAs should have good separation (not too close = weak signal)
-        ema_separation = (current['ema_9'] - current['ema_21']) / current['atr_14']
+        ema_separation = (arrs['ema_9'][idx] - arrs['ema_21'][idx]) / arrs['atr_14'][idx]
         sufficient_separation = ema_separation > 0.1  # At least 10% of ATR
         
         if not sufficient_separation:
@@ -162,44 +236,41 @@ class Strategy:
         self.highest_profit = 0  # Reset trailing stop tracker
         return True
     
-    def should_exit(self, data, idx, position):
+    def should_exit(self, arrs, idx, position):
         """Determine if we should exit a trade"""
-        current = data.iloc[idx]
-        previous = data.iloc[idx - 1]
-        
         # Calculate current profit
-        current_profit = (current['close'] - position['entry_price']) * position['position_size'] * symbol_specs[self.symbol]['point_value']
+        current_profit = (arrs['close'][idx] - position['entry_price']) * position['position_size'] * self._point_value
         
         # Update highest profit for trailing stop
         if current_profit > self.highest_profit:
             self.highest_profit = current_profit
         
         # === EXIT 1: STOP LOSS ===
-        if current['low'] <= position['stop_loss']:
+        if arrs['low'][idx] <= position['stop_loss']:
             return True, 'stop_loss'
         
         # === EXIT 2: TAKE PROFIT ===
-        if current['high'] >= position['take_profit']:
+        if arrs['high'][idx] >= position['take_profit']:
             return True, 'take_profit'
         
         # === EXIT 3: TRAILING STOP ===
         if self.use_trailing_stop:
             # Activate trailing stop after reaching certain profit
-            risk_amount = (position['entry_price'] - position['stop_loss']) * position['position_size'] * symbol_specs[self.symbol]['point_value']
+            risk_amount = (position['entry_price'] - position['stop_loss']) * position['position_size'] * self._point_value
             
             if self.highest_profit > (risk_amount * self.trailing_stop_activation):
                 # Calculate trailing stop level
-                trailing_stop_distance = current['atr_14'] * self.trailing_stop_distance
-                trailing_stop_level = current['close'] - trailing_stop_distance
+                trailing_stop_distance = arrs['atr_14'][idx] * self.trailing_stop_distance
+                trailing_stop_level = arrs['close'][idx] - trailing_stop_distance
                 
                 # If we have a valid trailing stop and price hits it
                 if trailing_stop_level > position['stop_loss']:
-                    if current['low'] <= trailing_stop_level:
+                    if arrs['low'][idx] <= trailing_stop_level:
                         return True, 'trailing_stop'
         
         # === EXIT 4: OPPOSITE CROSSOVER ===
-        was_above = previous['ema_9'] >= previous['ema_21']
-        is_below = current['ema_9'] < current['ema_21']
+        was_above = arrs['ema_9'][idx - 1] >= arrs['ema_21'][idx - 1]
+        is_below = arrs['ema_9'][idx] < arrs['ema_21'][idx]
         bearish_crossover = was_above and is_below
         
         if bearish_crossover:
@@ -207,23 +278,20 @@ class Strategy:
         
         # === EXIT 5: MOMENTUM REVERSAL ===
         # Exit if strong negative momentum appears
-        #if current['momentum_10'] < -current['atr_14']:
+        #if arrs['momentum_10'][idx] < -arrs['atr_14'][idx]:
         #    return True, 'momentum_reversal'
         
         return False, None
     
-    def calculate_position_size(self, data, idx, account_value):
+    def calculate_position_size(self, arrs, idx, account_value):
         """Calculate position size based on risk"""
-        current = data.iloc[idx]
-        
         # Calculate stop distance
-        stop_distance = current['atr_14'] * self.atr_stop_multiplier
+        stop_distance = arrs['atr_14'][idx] * self.atr_stop_multiplier
         
         # Risk amount in dollars
         risk_amount = account_value * self.risk_per_trade
         
         # Position size = Risk Amount / Stop Distance
-        point_value = symbol_specs[self.symbol]["point_value"]
-        position_size = int(risk_amount / (stop_distance * point_value))
+        position_size = int(risk_amount / (stop_distance * self._point_value))
         
         return max(1, position_size)  # At least 1 contract
\ No newline at end of file
@@ -1,4 +1,3 @@
-import pandas as pd
 import numpy as np
 
 symbol_specs = {
@@ -44,49 +43,59 @@ class Strategy:
     use_fixed_target = False  # Alternative: fixed R:R
     reward_risk_ratio = 2.0  # If using fixed target
     
+    # Indicators that must be defined before a bar can be traded
+    required_indicators = ['ema_9', 'ema_21', 'sma_50', 'atr_14', 'rsi']
+    
     def __init__(self):
         self.position = None
+        self._point_value = symbol_specs[self.symbol]['point_value']
+        self._valid = None
+        self._valid_for = None  # column arrays the valid mask was computed on
+    
+    def _valid_mask(self, arrs):
+        """Bars where every required indicator is finite, computed once per set of column arrays"""
+        if self._valid_for is not arrs:
+            cols = np.column_stack([arrs[ind] for ind in self.required_indicators])
+            self._valid = np.isfinite(cols).all(axis=1)
+            self._valid_for = arrs
+        return self._valid
     
-    def should_enter(self, data, idx):
+    def should_enter(self, arrs, idx):
         """Determine if we should enter a trade"""
         if idx < 60:
             return False
         
-        current = data.iloc[idx]
-        previous = data.iloc[idx - 1]
-        
         # Check required indicators
-        required = ['ema_9', 'ema_21', 'sma_50', 'atr_14', 'rsi']
-        if any(pd.isna(current[ind]) for ind in required):
+        if not self._valid_mask(arrs)[idx]:
             return False
         
         # === PRIMARY FILTER: UPTREND ===
-        in_uptrend = current['close'] > current['sma_50']
+        in_uptrend = arrs['close'][idx] > arrs['sma_50'][idx]
         if not in_uptrend:
             return False
         
         # === PULLBACK CONDITION ===
         # Price should be at or below 21 EMA (pullback from uptrend)
-        at_or_below_ema21 = current['close'] <= current['ema_21']
+        at_or_below_ema21 = arrs['close'][idx] <= arrs['ema_21'][idx]
         
         # But NOT too far below (avoid falling knives)
-        not_too_far = current['close'] > current['ema_21'] - (2 * current['atr_14'])
+        not_too_far = arrs['close'][idx] > arrs['ema_21'][idx] - (2 * arrs['atr_14'][idx])
         
         if not (at_or_below_ema21 and not_too_far):
             return False
         
         # === RSI OVERSOLD ===
-        is_oversold = current['rsi'] < self.rsi_oversold
+        is_oversold = arrs['rsi'][idx] < self.rsi_oversold
         if not is_oversold:
             return False
         
         # === REVERSAL SIGNAL ===
         # Look for bullish reversal: current bar closes higher than previous
-        bullish_close = current['close'] > previous['close']
+        bullish_close = arrs['close'][idx] > arrs['close'][idx - 1]
         
         # Or: bullish candlestick pattern (close in upper half of range)
-        candle_range = current['high'] - current['low']
-        close_position = (current['close'] - current['low']) / candle_range if candle_range > 0 else 0
+        candle_range = arrs['high'][idx] - arrs['low'][idx]
+        close_position = (arrs['close'][idx] - arrs['low'][idx]) / candle_range if candle_range > 0 else 0
         bullish_candle = close_position > 0.6  # Close in upper 40% of range
         
         reversal_signal = bullish_close or bullish_candle
@@ -96,50 +105,45 @@ class Strategy:
         
         return True
     
-    def should_exit(self, data, idx, position):
+    def should_exit(self, arrs, idx, position):
         """Determine if we should exit a trade"""
-        current = data.iloc[idx]
-        
         # === EXIT 1: STOP LOSS ===
-        if current['low'] <= position['stop_loss']:
+        if arrs['low'][idx] <= position['stop_loss']:
             return True, 'stop_loss'
         
         # === EXIT 2: TARGET - PRICE REACHES 9 EMA ===
         if self.use_ema_target:
             # Exit when price reaches 9 EMA (mean reversion complete)
-            if current['high'] >= current['ema_9']:
+            if arrs['high'][idx] >= arrs['ema_9'][idx]:
                 return True, 'ema_target'
         
         # === EXIT 3: FIXED R:R TARGET ===
         if self.use_fixed_target and 'take_profit' in position:
-            if current['high'] >= position['take_profit']:
+            if arrs['high'][idx] >= position['take_profit']:
                 return True, 'take_profit'
         
         # === EXIT 4: RSI OVERBOUGHT ===
         # Exit if RSI gets overbought (>70) - momentum exhausted
-        if current['rsi'] > 70:
+        if arrs['rsi'][idx] > 70:
             return True, 'overbought'
         
         # === EXIT 5: BREAKDOWN ===
         # Exit if price breaks below 21 EMA significantly
-        breakdown = current['close'] < current['ema_21'] - current['atr_14']
+        breakdown = arrs['close'][idx] < arrs['ema_21'][idx] - arrs['atr_14'][idx]
         if breakdown:
             return True, 'breakdown'
         
         return False, None
     
-    def calculate_position_size(self, data, idx, account_value):
+    def calculate_position_size(self, arrs, idx, account_value):
         """Calculate position size based on risk"""
-        current = data.iloc[idx]
-        
         # Calculate stop distance
-        stop_distance = current['atr_14'] * self.atr_stop_multiplier
+        stop_distance = arrs['atr_14'][idx] * self.atr_stop_multiplier
         
         # Risk amount in dollars
         risk_amount = account_value * self.risk_per_trade
         
         # Position size
-        point_value = symbol_specs[self.symbol]["point_value"]
-        position_size = int(risk_amount / (stop_distance * point_value))
+        position_size = int(risk_amount / (stop_distance * self._point_value))
         
         return max(1, position_size)
\ No newline at end of file
@@ -1,11 +1,292 @@
+import dataclasses
+import itertools
+from enum import IntEnum
 import pandas as pd
 import numpy as np
+import bottleneck as bn
+from _njit import njit, prange
+
+class Sym(IntEnum):
+    """Tradable symbols, indexing SPECS"""
+    NQ = 0
+    ES = 1
+    EURUSD = 2
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class Spec:
+    """Contract specification for one symbol"""
+    tick_size: float
+    point_value: float
+    name: str
+
+
+SPECS = (
+    Spec(tick_size=0.25, point_value=20, name='E-mini Nasdaq-100'),
+    Spec(tick_size=0.25, point_value=50, name='E-mini S&P 500'),
+    Spec(tick_size=0.000001, point_value=10, name='EURUSD'),
+)
+
+# The same table in the dict form the other strategy modules export
+symbol_specs = {sym.name: dataclasses.asdict(SPECS[sym]) for sym in Sym}
+
+# Exit reason codes for should_exit; stops and targets depend on the open
+# position, so only the SMA exits are precomputed by the signal scan.
+# end_of_data only closes out the last position in _run_trades
+EXIT_REASONS = (None, 'stop_loss', 'take_profit', 'death_cross', 'sma_breakdown', 'end_of_data')
+EXIT_STOP_LOSS = 1
+EXIT_TAKE_PROFIT = 2
+EXIT_DEATH_CROSS = 3
+EXIT_SMA_BREAKDOWN = 4
+EXIT_END_OF_DATA = 5
+
+# Bars per tile in the parameter sweep: the price arrays for one tile stay
+# in cache while every combination steps through it
+SWEEP_TILE = 8192
+
+
+def prepare_indicators(df, fast=20, slow=50):
+    """
+    Add the sma_<fast> / sma_<slow> columns this strategy reads to `df`, in
+    place, as DataPipeline does: one O(n) bottleneck pass per average, NaN
+    until a full window is available. Returns `df`
+    """
+    close = df['close'].to_numpy(dtype=np.float64)
+    for period in (fast, slow):
+        df[f'sma_{period}'] = bn.move_mean(close, window=period)
+    return df
+
+
+@njit(cache=True, inline='always')
+def _bar_signals(i, start_idx, diff_prev, diff, close, sma_fast, sma_slow, exit_cross):
+    """
+    Entry flag and SMA exit code (an EXIT_REASONS code, 0 for none) for bar
+    `i`, from the SMA difference on it and the bar before and its close and
+    SMA values. The one statement of the entry and SMA exit rules, shared by
+    the signal scan and the parameter sweep
+    """
+    # A NaN SMA fails every comparison, so undefined bars never signal
+    # === GOLDEN CROSS === 20 SMA moves from at/below to above the 50 SMA
+    # === CONFIRMATION: Price Above Both SMAs ===
+    entry = (i >= start_idx and diff_prev <= 0 and diff > 0
+             and close > sma_fast and close > sma_slow)
+    # === DEATH CROSS === 20 SMA moves from at/above to below the 50 SMA,
+    # which takes precedence over === PRICE BREAKS BELOW 50 SMA ===
+    if exit_cross and diff_prev >= 0 and diff < 0:
+        code = EXIT_DEATH_CROSS
+    elif close < sma_slow:
+        code = EXIT_SMA_BREAKDOWN
+    else:
+        code = 0
+    return entry, code
+
+
+@njit(cache=True, inline='always')
+def _open_position(account, entry_price, stop_distance, rr_ratio, risk_scale):
+    """Size, stop and target for a long entered at `entry_price`"""
+    size = max(1, int(account * risk_scale / stop_distance))
+    return size, entry_price - stop_distance, entry_price + stop_distance * rr_ratio
+
+
+@njit(cache=True, inline='always')
+def _bar_exit(low, high, stop_loss, take_profit, use_sl, use_tp, sma_code):
+    """
+    EXIT_REASONS code for an open position on a bar with this low and high,
+    0 to stay in: the stop, then the target, then the bar's SMA exit code
+    """
+    # === EXIT 1: STOP LOSS ===
+    if use_sl and low <= stop_loss:
+        return EXIT_STOP_LOSS
+    # === EXIT 2: TAKE PROFIT ===
+    if use_tp and high >= take_profit:
+        return EXIT_TAKE_PROFIT
+    # === EXIT 3: DEATH CROSS / EXIT 4: PRICE BREAKS BELOW 50 SMA ===
+    return sma_code
+
+
+@njit(cache=True, inline='always')
+def _exit_price(reason, stop_loss, take_profit, close):
+    """Fill price for an exit: the stop/target level itself, otherwise the bar's close"""
+    if reason == EXIT_STOP_LOSS:
+        return stop_loss
+    if reason == EXIT_TAKE_PROFIT:
+        return take_profit
+    return close
+
+
+@njit(cache=True, inline='always')
+def _scan_bars(sma20, sma50, close, start_idx, exit_cross, entries, exit_codes):
+    """
+    One linear pass over the SMA and close arrays, writing for every bar the
+    entry flag and SMA exit code from _bar_signals (entries only from
+    `start_idx` on)
+    """
+    n = len(close)
+    entries[0] = False
+    exit_codes[0] = 0
+    diff_prev = sma20[0] - sma50[0]
+    for i in range(1, n):
+        diff = sma20[i] - sma50[i]
+        entries[i], exit_codes[i] = _bar_signals(i, start_idx, diff_prev, diff, close[i],
+                                                 sma20[i], sma50[i], exit_cross)
+        diff_prev = diff
+
+
+def build_scan(exit_cross):
+    """
+    Signal scan (_scan_bars) with the death cross exit switch baked in as a
+    compile-time constant, so the compiled loop carries no branch for a
+    disabled exit. Kernels are built once per setting; see _scan_kernel
+    """
+    @njit(cache=True)
+    def scan(sma20, sma50, close, start_idx, entries, exit_codes):
+        _scan_bars(sma20, sma50, close, start_idx, exit_cross, entries, exit_codes)
+    return scan
+
+
+@njit(cache=True)
+def _run_trades(entries, exit_codes, close, low, high, stop_distance, init_cap,
+                rr_ratio, risk_scale, point_value, use_sl, use_tp):
+    """
+    Trade-by-trade backtest over the scanned signals: go long at an entry
+    bar's close, and exit on the first later bar where _bar_exit fires, or at
+    the last close. Fills are the stop/target level, otherwise the bar's close
+    Returns BacktestEngine's run tuple, as _sim_numba.simulate does:
+    (n_trades, entry_idx, exit_idx, entry_px, exit_px, sizes, pnls, pnl_pcts,
+    equity_after, reasons, equity, in_pos), with EXIT_REASONS codes
+    """
+    n = len(close)
+    entry_idx = np.empty(n, np.int64)
+    exit_idx = np.empty(n, np.int64)
+    entry_px = np.empty(n)
+    exit_px = np.empty(n)
+    sizes = np.empty(n, np.int64)
+    pnls = np.empty(n)
+    pnl_pcts = np.empty(n)
+    equity_after = np.empty(n)
+    reasons = np.empty(n, np.int8)
+    equity = np.empty(n)
+    in_pos = np.zeros(n, np.int8)
+    
+    account = init_cap
+    n_trades = 0
+    i = 0
+    while i < n:
+        equity[i] = account
+        if not entries[i]:
+            i += 1
+            continue
+        e = i
+        size, stop_loss, take_profit = _open_position(account, close[e], stop_distance[e],
+                                                      rr_ratio, risk_scale)
+        
+        x = n - 1
+        reason = EXIT_END_OF_DATA
+        for j in range(e + 1, n):
+            code = _bar_exit(low[j], high[j], stop_loss, take_profit, use_sl, use_tp, exit_codes[j])
+            if code:
+                reason = code
+                x = j
+                break
+        equity[e + 1:x + 1] = account
+        in_pos[e + 1:x + 1] = 1
+        
+        price = _exit_price(reason, stop_loss, take_profit, close[x])
+        pnl = (price - close[e]) * size * point_value
+        entry_equity = account
+        account += pnl
+        
+        entry_idx[n_trades] = e
+        exit_idx[n_trades] = x
+        entry_px[n_trades] = close[e]
+        exit_px[n_trades] = price
+        sizes[n_trades] = size
+        pnls[n_trades] = pnl
+        pnl_pcts[n_trades] = (pnl / entry_equity) * 100
+        equity_after[n_trades] = account
+        reasons[n_trades] = reason
+        n_trades += 1
+        # No new entry on the exit bar itself
+        i = x + 1
+    
+    return (n_trades, entry_idx, exit_idx, entry_px, exit_px, sizes, pnls,
+            pnl_pcts, equity_after, reasons, equity, in_pos)
+
+
+@njit(cache=True, parallel=True)
+def _sweep(sma_table, fast_k, slow_k, start_idx, stop_mult, close, low, high,
+           atr, init_cap, rr_ratio, risk_scale, point_value, use_sl, use_tp,
+           exit_cross, tile):
+    """
+    Backtest parameter combinations bar by bar, `tile` bars at a time: every
+    combination (in parallel) advances through a tile before the next one is
+    touched, so the price arrays are pulled into cache once per tile instead
+    of once per combination. Each combination's position and account carry
+    across tiles; combination k reads rows fast_k[k] / slow_k[k] of
+    `sma_table` and trades with stop multiplier stop_mult[k]. Signals, sizing,
+    exits and fills are the helpers _run_trades uses
+    Returns (n_trades, final_capital), one entry per combination
+    """
+    n = len(close)
+    n_combos = len(fast_k)
+    n_trades = np.zeros(n_combos, np.int64)
+    account = np.full(n_combos, init_cap)
+    in_pos = np.zeros(n_combos, np.bool_)
+    entry_px = np.zeros(n_combos)
+    stop_loss = np.zeros(n_combos)
+    take_profit = np.zeros(n_combos)
+    size = np.zeros(n_combos, np.int64)
+    diff_prev = np.empty(n_combos)
+    for k in range(n_combos):
+        diff_prev[k] = sma_table[fast_k[k], 0] - sma_table[slow_k[k], 0]
+    
+    for t0 in range(1, n, tile):
+        t1 = min(t0 + tile, n)
+        for k in prange(n_combos):
+            fast = sma_table[fast_k[k]]
+            slow = sma_table[slow_k[k]]
+            for i in range(t0, t1):
+                diff = fast[i] - slow[i]
+                entry, sma_code = _bar_signals(i, start_idx[k], diff_prev[k], diff, close[i],
+                                               fast[i], slow[i], exit_cross)
+                if in_pos[k]:
+                    reason = _bar_exit(low[i], high[i], stop_loss[k], take_profit[k],
+                                       use_sl, use_tp, sma_code)
+                    if reason:
+                        price = _exit_price(reason, stop_loss[k], take_profit[k], close[i])
+                        account[k] += (price - entry_px[k]) * size[k] * point_value
+                        n_trades[k] += 1
+                        in_pos[k] = False
+                elif entry:
+                    size[k], stop_loss[k], take_profit[k] = _open_position(
+                        account[k], close[i], atr[i] * stop_mult[k], rr_ratio, risk_scale)
+                    entry_px[k] = close[i]
+                    in_pos[k] = True
+                diff_prev[k] = diff
+    
+    # Close whatever is still open at the last close
+    for k in range(n_combos):
+        if in_pos[k]:
+            account[k] += (close[n - 1] - entry_px[k]) * size[k] * point_value
+            n_trades[k] += 1
+    return n_trades, account
+
+
+try:
+    # Ahead-of-time build of both kernels (python compile_strategy.py): no JIT on first use
+    import sma_signals
+    _SCAN_KERNELS = {True: sma_signals.scan_exit_cross, False: sma_signals.scan}
+except ImportError:
+    _SCAN_KERNELS = {}
+
+
+def _scan_kernel(exit_cross):
+    """Compiled signal scan for the given death cross exit setting"""
+    exit_cross = bool(exit_cross)
+    if exit_cross not in _SCAN_KERNELS:
+        _SCAN_KERNELS[exit_cross] = build_scan(exit_cross)
+    return _SCAN_KERNELS[exit_cross]
 
-symbol_specs = {
-    'NQ': {'tick_size': 0.25, 'point_value': 20, 'name': 'E-mini Nasdaq-100'},
-    'ES': {'tick_size': 0.25, 'point_value': 50, 'name': 'E-mini S&P 500'},
-    'EURUSD': {'tick_size': 0.000001, 'point_value': 10, 'name': 'EURUSD'}
-}
 
 class Strategy:
     """
@@ -27,6 +308,10 @@ class Strategy:
     - Has fewer trades (more selective)
     - Holds positions longer (catches big moves)
     - Works in trending markets (which your data seems to be)
+    
+    Reads the close, low, high, atr_14, sma_<fast_sma_period> and
+    sma_<slow_sma_period> columns; the SMAs come from DataPipeline or
+    prepare_indicators, and any that are missing are built from the closes
     """
     
     # Strategy parameters
@@ -47,85 +332,160 @@ class Strategy:
     use_stop_loss = True  # Use ATR-based stop
     use_take_profit = False  # Don't use fixed target (let winners run)
     
+    # Names for the exit reason codes run_trades returns
+    EXIT_REASONS = EXIT_REASONS
+    
     def __init__(self):
         self.position = None
+        spec = SPECS[Sym[self.symbol]]
+        self._point_value = spec.point_value
+        self._signal_data = None  # column arrays the cached values were computed from
+        self._signal_params = None  # and the parameter values they were built with
+        self._entry_mask = None
+        self._exit_signal = None
+        self._start_idx = 0
     
-    def should_enter(self, data, idx):
-        """Determine if we should enter a trade"""
-        if idx < max(self.fast_sma_period, self.slow_sma_period) + 5:
-            return False
+    def precompute(self, arrs):
+        """
+        Keep the columns the rules read and evaluate the entry
+        and SMA exit rules for every bar at once, so should_enter and
+        should_exit on `arrs` are lookups. The per-bar methods call it again
+        whenever `arrs` or a parameter it reads (see _params) has changed
+        """
+        # The SMAs are only ever compared, so float32 is plenty and halves the
+        # bytes the scan streams; prices and sizing stay float64
+        self._sma_fast = np.asarray(self._sma(arrs, self.fast_sma_period), dtype=np.float32)
+        self._sma_slow = np.asarray(self._sma(arrs, self.slow_sma_period), dtype=np.float32)
+        self._close = arrs['close']
+        self._atr = arrs['atr_14']
+        self._low = arrs['low']
+        self._high = arrs['high']
         
-        current = data.iloc[idx]
-        previous = data.iloc[idx - 1]
+        # Position sizing: contracts = account * (risk / point value) / stop
+        # distance, with the loop-invariant ratio folded into one constant
+        self._stop_distance = self._atr * self.atr_stop_multiplier
+        self._risk_scale = self.risk_per_trade / self._point_value
         
-        # Check indicators exist
-        if pd.isna(current['sma_20']) or pd.isna(current['sma_50']):
-            return False
+        # First bar that can be traded: both SMAs defined on it and on the bar
+        # before, and past the warm-up bars
+        defined = np.isfinite(self._sma_fast) & np.isfinite(self._sma_slow)
+        self._start_idx = max(int(np.argmax(defined)) + 1,
+                              self._warmup_bars(self.fast_sma_period, self.slow_sma_period))
         
-        # === GOLDEN CROSS ===
-        # Previous bar: 20 SMA was below 50 SMA
-        # Current bar: 20 SMA is now above 50 SMA
-        was_below = previous['sma_20'] <= previous['sma_50']
-        is_above = current['sma_20'] > current['sma_50']
-        golden_cross = was_below and is_above
+        n = len(self._close)
+        entry = np.empty(n, dtype=np.bool_)
+        self._exit_signal = np.empty(n, dtype=np.int8)
+        _scan_kernel(self.exit_on_cross)(self._sma_fast, self._sma_slow, self._close,
+                                         self._start_idx, entry, self._exit_signal)
         
-        if not golden_cross:
-            return False
-        
-        # === CONFIRMATION: Price Above Both SMAs ===
-        price_above_smas = (current['close'] > current['sma_20'] and 
-                           current['close'] > current['sma_50'])
-        
-        if not price_above_smas:
+        self._entry_mask = entry
+        self._signal_data = arrs
+        self._signal_params = self._params()
+        return entry
+    
+    @staticmethod
+    def _sma(arrs, period):
+        """
+        The sma_<period> column of `arrs`; when it is missing, the same average
+        prepare_indicators would add, built from the closes
+        """
+        if f'sma_{period}' in arrs:
+            return arrs[f'sma_{period}']
+        return bn.move_mean(arrs['close'], window=period)
+    
+    @staticmethod
+    def _warmup_bars(fast_period, slow_period):
+        """Bars skipped at the start of the data before a golden cross can be traded"""
+        return max(fast_period, slow_period) + 5
+    
+    def _params(self):
+        """Values of the parameters precompute's arrays depend on"""
+        return (self.fast_sma_period, self.slow_sma_period, self.exit_on_cross,
+                self.atr_stop_multiplier, self.risk_per_trade)
+    
+    def _ensure_precomputed(self, arrs):
+        """Run precompute unless its arrays are for `arrs` and the current parameters"""
+        if self._signal_data is not arrs or self._signal_params != self._params():
+            self.precompute(arrs)
+    
+    def should_enter(self, arrs, idx):
+        """Determine if we should enter a trade"""
+        self._ensure_precomputed(arrs)
+        if idx < self._start_idx:
             return False
-        
-        return True
+        return bool(self._entry_mask[idx])
     
-    def should_exit(self, data, idx, position):
-        """Determine if we should exit a trade"""
-        current = data.iloc[idx]
-        previous = data.iloc[idx - 1]
-        
-        # === EXIT 1: STOP LOSS ===
-        if self.use_stop_loss:
-            if current['low'] <= position['stop_loss']:
-                return True, 'stop_loss'
-        
-        # === EXIT 2: TAKE PROFIT ===
-        if self.use_take_profit and 'take_profit' in position:
-            if current['high'] >= position['take_profit']:
-                return True, 'take_profit'
-        
-        # === EXIT 3: DEATH CROSS ===
-        if self.exit_on_cross:
-            # 20 SMA crosses back below 50 SMA (trend reversal)
-            was_above = previous['sma_20'] >= previous['sma_50']
-            is_below = current['sma_20'] < current['sma_50']
-            death_cross = was_above and is_below
-            
-            if death_cross:
-                return True, 'death_cross'
-        
-        # === EXIT 4: PRICE BREAKS BELOW 50 SMA ===
-        # Emergency exit if price falls significantly
-        price_breakdown = current['close'] < current['sma_50']
-        if price_breakdown:
-            return True, 'sma_breakdown'
-        
+    def should_exit(self, arrs, idx, position):
+        """Determine if we should exit a trade; the rules are _bar_exit's"""
+        self._ensure_precomputed(arrs)
+        code = _bar_exit(self._low[idx], self._high[idx], position['stop_loss'],
+                         position.get('take_profit', np.inf), self.use_stop_loss,
+                         self.use_take_profit and 'take_profit' in position,
+                         self._exit_signal[idx])
+        if code:
+            return True, EXIT_REASONS[code]
         return False, None
     
-    def calculate_position_size(self, data, idx, account_value):
-        """Calculate position size based on risk"""
-        current = data.iloc[idx]
+    def run_trades(self, arrs, initial_capital=100000):
+        """
+        Run the whole long-only backtest over `arrs` in one compiled call, with
+        no per-bar Python. BacktestEngine runs this strategy through it; returns
+        _run_trades' tuple, with exit reasons as codes into EXIT_REASONS
+        """
+        self.precompute(arrs)
+        return _run_trades(
+            self._entry_mask, self._exit_signal, self._close, self._low, self._high,
+            self._stop_distance, float(initial_capital), float(self.reward_risk_ratio),
+            float(self._risk_scale), float(self._point_value),
+            bool(self.use_stop_loss), bool(self.use_take_profit)
+        )
+    
+    def sweep(self, arrs, fast_periods, slow_periods, stop_multipliers, initial_capital=100000):
+        """
+        Backtest every (fast SMA, slow SMA, ATR stop multiplier) combination
+        over `arrs` in one parallel compiled call; the other parameters come
+        from this strategy. Returns one row per combination with its
+        parameters, trade count and final capital
+        """
+        self.precompute(arrs)
+        combos = np.asarray(list(itertools.product(fast_periods, slow_periods, stop_multipliers)),
+                            dtype=np.float64)
+        fasts, slows, stop_mult = combos[:, 0].astype(np.int64), combos[:, 1].astype(np.int64), combos[:, 2]
         
-        # Calculate stop distance
-        stop_distance = current['atr_14'] * self.atr_stop_multiplier
+        # Each distinct period's SMA is built once, as a row of one table, in
+        # the same float32 the single backtest scans
+        periods = np.unique(np.concatenate((fasts, slows)))
+        sma_table = np.empty((len(periods), len(self._close)), dtype=np.float32)
+        for row, period in enumerate(periods):
+            sma_table[row] = bn.move_mean(self._close, window=int(period))
+        fast_k, slow_k = np.searchsorted(periods, fasts), np.searchsorted(periods, slows)
         
-        # Risk amount in dollars
-        risk_amount = account_value * self.risk_per_trade
+        # First tradable bar per combination, as precompute derives it
+        defined = np.isfinite(sma_table)
+        start_idx = np.array([
+            max(int(np.argmax(defined[f] & defined[s])) + 1, self._warmup_bars(fast, slow))
+            for f, s, fast, slow in zip(fast_k, slow_k, fasts, slows)
+        ], dtype=np.int64)
         
-        # Position size
-        point_value = symbol_specs[self.symbol]["point_value"]
-        position_size = int(risk_amount / (stop_distance * point_value))
+        n_trades, final_capital = _sweep(
+            sma_table, fast_k, slow_k, start_idx, stop_mult,
+            self._close, self._low, self._high, self._atr,
+            float(initial_capital), float(self.reward_risk_ratio), float(self._risk_scale),
+            float(self._point_value), bool(self.use_stop_loss), bool(self.use_take_profit),
+            bool(self.exit_on_cross), SWEEP_TILE
+        )
+        return pd.DataFrame({
+            'fast_sma_period': fasts,
+            'slow_sma_period': slows,
+            'atr_stop_multiplier': stop_mult,
+            'total_trades': n_trades,
+            'final_capital': final_capital,
+        })
+    
+    def calculate_position_size(self, arrs, idx, account_value):
+        """Calculate position size based on risk"""
+        self._ensure_precomputed(arrs)
         
-        return max(1, position_size)
\ No newline at end of file
+        size, _, _ = _open_position(float(account_value), self._close[idx], self._stop_distance[idx],
+                                    float(self.reward_risk_ratio), self._risk_scale)
+        return int(size)